@@ -352,6 +352,10 @@ struct serialqueue {
     uint8_t input_buf[4096];
     uint8_t need_sync;
     int input_pos;
+    // Output buffering (when writing to a debug file)
+    int write_only;
+    uint8_t output_buf[4096];
+    int output_pos;
     // Threading
     pthread_t tid;
     pthread_mutex_t lock; // protects variables below
@@ -629,6 +633,18 @@ retransmit_event(struct serialqueue *sq, double eventtime)
     return waketime;
 }
 
+// Write any buffered debug file output
+static void
+flush_output(struct serialqueue *sq)
+{
+    if (!sq->output_pos)
+        return;
+    int ret = write(sq->serial_fd, sq->output_buf, sq->output_pos);
+    if (ret < 0)
+        report_errno("write", ret);
+    sq->output_pos = 0;
+}
+
 // Construct a block of data and send to the serial port
 static void
 build_and_send_command(struct serialqueue *sq, double eventtime)
@@ -674,9 +690,17 @@ build_and_send_command(struct serialqueue *sq, double eventtime)
     out->msg[out->len - MESSAGE_TRAILER_SYNC] = MESSAGE_SYNC;
 
     // Send message
-    int ret = write(sq->serial_fd, out->msg, out->len);
-    if (ret < 0)
-        report_errno("write", ret);
+    if (sq->write_only) {
+        // Batch up writes to the debug output file
+        if (sq->output_pos + out->len > sizeof(sq->output_buf))
+            flush_output(sq);
+        memcpy(&sq->output_buf[sq->output_pos], out->msg, out->len);
+        sq->output_pos += out->len;
+    } else {
+        int ret = write(sq->serial_fd, out->msg, out->len);
+        if (ret < 0)
+            report_errno("write", ret);
+    }
     sq->bytes_write += out->len;
     if (eventtime > sq->idle_time)
         sq->idle_time = eventtime;
@@ -779,6 +803,8 @@ command_event(struct serialqueue *sq, double eventtime)
             break;
         build_and_send_command(sq, eventtime);
     }
+    // No more ready messages - write out any buffered debug file output
+    flush_output(sq);
     pthread_mutex_unlock(&sq->lock);
     return waketime;
 }
@@ -806,6 +832,7 @@ serialqueue_alloc(int serial_fd, int write_only)
 
     // Reactor setup
     sq->serial_fd = serial_fd;
+    sq->write_only = write_only;
     int ret = pipe(sq->pipe_fds);
     if (ret)
         goto fail;
@@ -343,6 +343,18 @@ stepcompress_reset(struct stepcompress *sc, uint64_t last_step_clock)
     return 0;
 }
 
+// Reset the step clock and queue a matching reset command to the mcu
+int __visible
+stepcompress_reset_clock(struct stepcompress *sc, uint32_t reset_msgid
+                         , uint64_t last_step_clock)
+{
+    int ret = stepcompress_reset(sc, last_step_clock);
+    if (ret)
+        return ret;
+    uint32_t msg[3] = { reset_msgid, sc->oid, last_step_clock };
+    return stepcompress_queue_msg(sc, msg, 3);
+}
+
 // Indicate the stepper is in homing mode (or done homing if zero)
 int __visible
 stepcompress_set_homing(struct stepcompress *sc, uint64_t homing_clock)
@@ -461,15 +461,15 @@ class ZMesh:
         self.avg_z = 0.
         logging.debug('bed_mesh: probe/mesh parameters:')
         for key, value in self.probe_params.iteritems():
-            logging.debug("%s :  %s" % (key, value))
+            logging.debug("%s :  %s", key, value)
         self.mesh_x_min = params['min_x'] + params['x_offset']
         self.mesh_x_max = params['max_x'] + params['x_offset']
         self.mesh_y_min = params['min_y'] + params['y_offset']
         self.mesh_y_max = params['max_y'] + params['y_offset']
         logging.debug(
-            "bed_mesh: Mesh Min: (%.2f,%.2f) Mesh Max: (%.2f,%.2f)"
-            % (self.mesh_x_min, self.mesh_y_min,
-               self.mesh_x_max, self.mesh_y_max))
+            "bed_mesh: Mesh Min: (%.2f,%.2f) Mesh Max: (%.2f,%.2f)",
+            self.mesh_x_min, self.mesh_y_min,
+            self.mesh_x_max, self.mesh_y_max)
         if params['algo'] == 'bicubic':
             self._sample = self._sample_bicubic
         else:
@@ -494,8 +494,8 @@ class ZMesh:
         self.mesh_y_count = py_cnt * mesh_y_mult - (mesh_y_mult - 1)
         self.x_mult = mesh_x_mult
         self.y_mult = mesh_y_mult
-        logging.debug("bed_mesh: Mesh grid size - X:%d, Y:%d"
-                      % (self.mesh_x_count, self.mesh_y_count))
+        logging.debug("bed_mesh: Mesh grid size - X:%d, Y:%d",
+                      self.mesh_x_count, self.mesh_y_count)
         self.mesh_x_dist = (self.mesh_x_max - self.mesh_x_min) / \
                            (self.mesh_x_count - 1)
         self.mesh_y_dist = (self.mesh_y_max - self.mesh_y_min) / \
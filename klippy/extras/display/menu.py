@@ -1052,8 +1052,7 @@ class MenuManager:
         for cfg_name, obj in self.printer.lookup_objects():
             name = ".".join(str(cfg_name).split())
             self.objs[name] = obj
-            logging.debug("Load module '%s' -> %s" % (
-                str(name), str(obj.__class__)))
+            logging.debug("Load module '%s' -> %s", name, obj.__class__)
         # start timer
         reactor = self.printer.get_reactor()
         reactor.register_timer(self.timer_event, reactor.NOW)
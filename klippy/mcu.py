@@ -4,6 +4,7 @@
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
 import sys, os, zlib, logging, math
+import greenlet
 import serialhdl, pins, chelper, clocksync
 
 class error(Exception):
@@ -28,6 +29,10 @@ class MCU_stepper:
                                       self._ffi_lib.stepcompress_free)
         self._mcu.register_stepqueue(self._stepqueue)
         self._stepper_kinematics = self._itersolve_gen_steps = None
+        self._itersolve_calc_position = (
+            self._ffi_lib.itersolve_calc_position_from_coord)
+        self._itersolve_get_pos = self._ffi_lib.itersolve_get_commanded_pos
+        self._itersolve_set_pos = self._ffi_lib.itersolve_set_commanded_pos
         self.set_ignore_move(False)
     def get_mcu(self):
         return self._mcu
@@ -71,16 +76,15 @@ class MCU_stepper:
     def get_step_dist(self):
         return self._step_dist
     def calc_position_from_coord(self, coord):
-        return self._ffi_lib.itersolve_calc_position_from_coord(
+        return self._itersolve_calc_position(
             self._stepper_kinematics, coord[0], coord[1], coord[2])
     def set_position(self, coord):
         self.set_commanded_position(self.calc_position_from_coord(coord))
     def get_commanded_position(self):
-        return self._ffi_lib.itersolve_get_commanded_pos(
-            self._stepper_kinematics)
+        return self._itersolve_get_pos(self._stepper_kinematics)
     def set_commanded_position(self, pos):
         self._mcu_position_offset += self.get_commanded_position() - pos
-        self._ffi_lib.itersolve_set_commanded_pos(self._stepper_kinematics, pos)
+        self._itersolve_set_pos(self._stepper_kinematics, pos)
     def get_mcu_position(self):
         mcu_pos_dist = self.get_commanded_position() + self._mcu_position_offset
         mcu_pos = mcu_pos_dist / self._step_dist
@@ -111,12 +115,8 @@ class MCU_stepper:
         ret = self._ffi_lib.stepcompress_set_homing(self._stepqueue, 0)
         if ret:
             raise error("Internal error in stepcompress")
-        ret = self._ffi_lib.stepcompress_reset(self._stepqueue, 0)
-        if ret:
-            raise error("Internal error in stepcompress")
-        data = (self._reset_cmd_id, self._oid, 0)
-        ret = self._ffi_lib.stepcompress_queue_msg(
-            self._stepqueue, data, len(data))
+        ret = self._ffi_lib.stepcompress_reset_clock(
+            self._stepqueue, self._reset_cmd_id, 0)
         if ret:
             raise error("Internal error in stepcompress")
         if not did_trigger or self._mcu.is_fileoutput():
@@ -126,7 +126,7 @@ class MCU_stepper:
         mcu_pos_dist = params['pos'] * self._step_dist
         if self._invert_dir:
             mcu_pos_dist = -mcu_pos_dist
-        self._ffi_lib.itersolve_set_commanded_pos(
+        self._itersolve_set_pos(
             self._stepper_kinematics, mcu_pos_dist - self._mcu_position_offset)
     def step_itersolve(self, cmove):
         ret = self._itersolve_gen_steps(self._stepper_kinematics, cmove)
@@ -148,6 +148,7 @@ class MCU_endstop:
         self._homing = False
         self._min_query_time = self._next_query_time = 0.
         self._last_state = {}
+        self._waiter = None
     def get_mcu(self):
         return self._mcu
     def add_stepper(self, stepper):
@@ -192,14 +193,25 @@ class MCU_endstop:
         for s in self._steppers:
             s.note_homing_start(clock)
     def home_wait(self, home_end_time):
-        eventtime = self._mcu.monotonic()
-        while self._check_busy(eventtime, home_end_time):
-            eventtime = self._mcu.pause(eventtime + 0.1)
+        self._wait(home_end_time)
     def home_finalize(self):
         pass
     def _handle_end_stop_state(self, params):
         logging.debug("end_stop_state %s", params)
         self._last_state = params
+        self._mcu.register_async_callback(self._wake_waiter)
+    def _wake_waiter(self, eventtime):
+        if self._waiter is not None:
+            self._mcu.wake(self._waiter)
+    def _wait(self, home_end_time=0.):
+        # Sleep until the next query is due or a new state is reported
+        self._waiter = greenlet.getcurrent()
+        try:
+            eventtime = self._mcu.monotonic()
+            while self._check_busy(eventtime, home_end_time):
+                eventtime = self._mcu.pause(self._next_query_time)
+        finally:
+            self._waiter = None
     def _check_busy(self, eventtime, home_end_time=0.):
         # Check if need to send an end_stop_query command
         last_sent_time = self._last_state.get('#sent_time', -1.)
@@ -230,9 +242,7 @@ class MCU_endstop:
         self._homing = False
         self._min_query_time = self._next_query_time = self._mcu.monotonic()
     def query_endstop_wait(self):
-        eventtime = self._mcu.monotonic()
-        while self._check_busy(eventtime):
-            eventtime = self._mcu.pause(eventtime + 0.1)
+        self._wait()
         return self._last_state.get('pin', self._invert) ^ self._invert
 
 class MCU_digital_out:
@@ -247,6 +257,7 @@ class MCU_digital_out:
         self._max_duration = 2.
         self._last_clock = 0
         self._set_cmd = None
+        self._encode_buf = []
     def get_mcu(self):
         return self._mcu
     def setup_max_duration(self, max_duration):
@@ -274,7 +285,8 @@ class MCU_digital_out:
     def set_digital(self, print_time, value):
         clock = self._mcu.print_time_to_clock(print_time)
         self._set_cmd.send([self._oid, clock, (not not value) ^ self._invert],
-                           minclock=self._last_clock, reqclock=clock)
+                           minclock=self._last_clock, reqclock=clock,
+                           encode_buf=self._encode_buf)
         self._last_clock = clock
     def set_pwm(self, print_time, value):
         self.set_digital(print_time, value >= 0.5)
@@ -294,6 +306,7 @@ class MCU_pwm:
         self._last_clock = 0
         self._pwm_max = 0.
         self._set_cmd = None
+        self._encode_buf = []
     def get_mcu(self):
         return self._mcu
     def setup_max_duration(self, max_duration):
@@ -356,7 +369,8 @@ class MCU_pwm:
             value = 1. - value
         value = int(max(0., min(1., value)) * self._pwm_max + 0.5)
         self._set_cmd.send([self._oid, clock, value],
-                           minclock=self._last_clock, reqclock=clock)
+                           minclock=self._last_clock, reqclock=clock,
+                           encode_buf=self._encode_buf)
         self._last_clock = clock
 
 class MCU_adc:
@@ -468,11 +482,12 @@ class MCU:
     # Serial callbacks
     def _handle_mcu_stats(self, params):
         count = params['count']
-        tick_sum = params['sum']
+        tick_sum = float(params['sum'])
         c = 1.0 / (count * self._mcu_freq)
         self._mcu_tick_avg = tick_sum * c
         tick_sumsq = params['sumsq'] * self._stats_sumsq_base
-        self._mcu_tick_stddev = c * math.sqrt(count*tick_sumsq - tick_sum**2)
+        tick_var = count * tick_sumsq - tick_sum * tick_sum
+        self._mcu_tick_stddev = c * math.sqrt(max(0., tick_var))
         self._mcu_tick_awake = tick_sum / self._mcu_freq
     def _handle_shutdown(self, params):
         if self._is_shutdown:
@@ -517,45 +532,46 @@ class MCU:
                 return 0.
             self.estimated_print_time = dummy_estimated_print_time
     def _add_custom(self):
-        for line in self._custom.split('\n'):
-            line = line.strip()
-            cpos = line.find('#')
-            if cpos >= 0:
-                line = line[:cpos].strip()
-            if not line:
-                continue
-            self.add_config_cmd(line)
+        lines = (line.split('#', 1)[0].strip()
+                 for line in self._custom.split('\n'))
+        self._config_cmds.extend(line for line in lines if line)
     def _send_config(self, prev_crc):
         # Build config commands
         for cb in self._config_callbacks:
             cb()
         self._add_custom()
-        self._config_cmds.insert(0, "allocate_oids count=%d" % (
-            self._oid_count,))
+        self._config_cmds = ["allocate_oids count=%d" % (
+            self._oid_count,)] + self._config_cmds
         # Resolve pin names
         mcu_type = self._serial.msgparser.get_constant('MCU')
         pin_resolver = pins.PinResolver(mcu_type)
         if self._pin_map is not None:
             pin_resolver.update_aliases(self._pin_map)
-        for i, cmd in enumerate(self._config_cmds):
-            self._config_cmds[i] = pin_resolver.update_command(cmd)
-        for i, cmd in enumerate(self._init_cmds):
-            self._init_cmds[i] = pin_resolver.update_command(cmd)
+        self._config_cmds = pin_resolver.update_commands(self._config_cmds)
+        self._init_cmds = pin_resolver.update_commands(self._init_cmds)
         # Calculate config CRC
-        config_crc = zlib.crc32('\n'.join(self._config_cmds)) & 0xffffffff
+        config_crc = zlib.crc32(self._config_cmds[0])
+        for c in self._config_cmds[1:]:
+            config_crc = zlib.crc32(c, zlib.crc32('\n', config_crc))
+        config_crc &= 0xffffffff
         self.add_config_cmd("finalize_config crc=%d" % (config_crc,))
         # Transmit config messages (if needed)
+        msgparser = self._serial.msgparser
+        cmd_queue = self._serial.default_cmd_queue
         if prev_crc is None:
             logging.info("Sending MCU '%s' printer configuration...",
                          self._name)
-            for c in self._config_cmds:
-                self._serial.send(c)
+            encoded_cmds = [msgparser.create_command(c)
+                            for c in self._config_cmds]
+            for cmd in encoded_cmds:
+                self._serial.raw_send(cmd, 0, 0, cmd_queue)
         elif config_crc != prev_crc:
             self._check_restart("CRC mismatch")
             raise error("MCU '%s' CRC does not match config" % (self._name,))
         # Transmit init messages
-        for c in self._init_cmds:
-            self._serial.send(c)
+        encoded_cmds = [msgparser.create_command(c) for c in self._init_cmds]
+        for cmd in encoded_cmds:
+            self._serial.raw_send(cmd, 0, 0, cmd_queue)
     def _send_get_config(self):
         get_config_cmd = self.lookup_command("get_config")
         if self.is_fileoutput():
@@ -685,6 +701,13 @@ class MCU:
         return self._clocksync.clock32_to_clock64(clock32)
     def pause(self, waketime):
         return self._reactor.pause(waketime)
+    def wake(self, waiter):
+        # Resume a greenlet blocked in pause() before its waketime
+        timer = getattr(waiter, 'timer', None)
+        if timer is not None:
+            self._reactor.update_timer(timer, self._reactor.NOW)
+    def register_async_callback(self, callback):
+        self._reactor.register_async_callback(callback)
     def monotonic(self):
         return self._reactor.monotonic()
     # Restarts
@@ -40,12 +40,13 @@ class PT_uint32:
     is_int = 1
     max_length = 5
     signed = 0
-    def encode(self, out, v):
-        if v >= 0xc000000 or v < -0x4000000: out.append((v>>28) & 0x7f | 0x80)
-        if v >= 0x180000 or v < -0x80000:    out.append((v>>21) & 0x7f | 0x80)
-        if v >= 0x3000 or v < -0x1000:       out.append((v>>14) & 0x7f | 0x80)
-        if v >= 0x60 or v < -0x20:           out.append((v>>7)  & 0x7f | 0x80)
-        out.append(v & 0x7f)
+    encode_src = [
+        "if v >= 0xc000000 or v < -0x4000000: append((v>>28) & 0x7f | 0x80)",
+        "if v >= 0x180000 or v < -0x80000:    append((v>>21) & 0x7f | 0x80)",
+        "if v >= 0x3000 or v < -0x1000:       append((v>>14) & 0x7f | 0x80)",
+        "if v >= 0x60 or v < -0x20:           append((v>>7)  & 0x7f | 0x80)",
+        "append(v & 0x7f)",
+    ]
     def parse(self, s, pos):
         c = s[pos]
         pos += 1
@@ -73,9 +74,10 @@ class PT_byte(PT_uint32):
 class PT_string:
     is_int = 0
     max_length = 64
-    def encode(self, out, v):
-        out.append(len(v))
-        out.extend(bytearray(v))
+    encode_src = [
+        "append(len(v))",
+        "out.extend(bytearray(v))",
+    ]
     def parse(self, s, pos):
         l = s[pos]
         return str(bytearray(s[pos+1:pos+l+1])), pos+l+1
@@ -97,6 +99,21 @@ def convert_msg_format(msgformat):
     mf = mf.replace('%.*s', '%s').replace('%*s', '%s')
     return mf
 
+# Generate a function that encodes a command into a list (avoids a
+# method dispatch per parameter).  The 'params' list contains a python
+# expression to look up each parameter value along with its type.
+def build_encoder(msgid, params):
+    src = ["def encode_into(out, params):",
+           "    del out[:]",
+           "    append = out.append",
+           "    append(%d)" % (msgid,)]
+    for expr, t in params:
+        src.append("    v = %s" % (expr,))
+        src.extend(["    " + line for line in t.encode_src])
+    gbls = {}
+    exec("\n".join(src), gbls)
+    return gbls['encode_into']
+
 class MessageFormat:
     def __init__(self, msgid, msgformat):
         self.msgid = msgid
@@ -108,17 +125,23 @@ class MessageFormat:
         self.param_types = [MessageTypes[fmt] for name, fmt in argparts]
         self.param_names = [(name, MessageTypes[fmt]) for name, fmt in argparts]
         self.name_to_type = dict(self.param_names)
+    def encode_into(self, out, params):
+        # Replaces the contents of the list 'out' with the encoded command.
+        # The encoder is built on first use and then replaces this method.
+        self.encode_into = build_encoder(self.msgid, [
+            ("params[%d]" % (i,), t) for i, t in enumerate(self.param_types)])
+        self.encode_into(out, params)
     def encode(self, params):
         out = []
-        out.append(self.msgid)
-        for i, t in enumerate(self.param_types):
-            t.encode(out, params[i])
+        self.encode_into(out, params)
         return out
+    def _encode_by_name_into(self, out, params):
+        self._encode_by_name_into = build_encoder(self.msgid, [
+            ("params[%s]" % (repr(name),), t) for name, t in self.param_names])
+        self._encode_by_name_into(out, params)
     def encode_by_name(self, **params):
         out = []
-        out.append(self.msgid)
-        for name, t in self.param_names:
-            t.encode(out, params[name])
+        self._encode_by_name_into(out, params)
         return out
     def parse(self, s, pos):
         pos += 1
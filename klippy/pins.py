@@ -186,24 +186,40 @@ class PinResolver:
             update_map_beaglebone(self.pins, self.mcu_type)
         else:
             raise error("Unknown pin alias mapping '%s'" % (mapping_name,))
+    def _pin_fixup(self, m):
+        name = m.group('name')
+        if name not in self.pins:
+            raise error("Unable to translate pin name: %s" % (m.string,))
+        pin_id = self.pins[name]
+        if (name != self.active_pins.setdefault(pin_id, name)
+            and self.validate_aliases):
+            raise error("pin %s is an alias for %s" % (
+                name, self.active_pins[pin_id]))
+        return m.group('prefix') + str(pin_id)
     def update_command(self, cmd):
-        def pin_fixup(m):
-            name = m.group('name')
-            if name not in self.pins:
-                raise error("Unable to translate pin name: %s" % (cmd,))
-            pin_id = self.pins[name]
-            if (name != self.active_pins.setdefault(pin_id, name)
-                and self.validate_aliases):
-                raise error("pin %s is an alias for %s" % (
-                    name, self.active_pins[pin_id]))
-            return m.group('prefix') + str(pin_id)
-        return re_pin.sub(pin_fixup, cmd)
+        return re_pin.sub(self._pin_fixup, cmd)
+    def update_commands(self, cmds):
+        pin_fixup = self._pin_fixup
+        return [re_pin.sub(pin_fixup, cmd) for cmd in cmds]
 
 
 ######################################################################
 # Pin to chip mapping
 ######################################################################
 
+# Pin description prefix decoding, indexed by (can_pullup, can_invert)
+def _build_pin_desc_re(can_pullup, can_invert):
+    pullup = invert = ''
+    if can_pullup:
+        pullup = r'\^?'
+    if can_invert:
+        invert = '!?'
+    return re.compile(r'(?P<pullup>%s)\s*(?P<invert>%s)\s*(?P<desc>.*)' % (
+        pullup, invert), re.DOTALL)
+re_pin_desc = {
+    (can_pullup, can_invert): _build_pin_desc_re(can_pullup, can_invert)
+    for can_pullup in (False, True) for can_invert in (False, True) }
+
 class PrinterPins:
     error = error
     def __init__(self):
@@ -211,14 +227,9 @@ class PrinterPins:
         self.active_pins = {}
     def lookup_pin(self, pin_desc, can_invert=False, can_pullup=False,
                    share_type=None):
-        desc = pin_desc.strip()
-        pullup = invert = 0
-        if can_pullup and desc.startswith('^'):
-            pullup = 1
-            desc = desc[1:].strip()
-        if can_invert and desc.startswith('!'):
-            invert = 1
-            desc = desc[1:].strip()
+        m = re_pin_desc[can_pullup, can_invert].match(pin_desc.strip())
+        pullup, invert = len(m.group('pullup')), len(m.group('invert'))
+        desc = m.group('desc')
         if ':' not in desc:
             chip_name, pin = 'mcu', desc
         else:
@@ -180,8 +180,15 @@ class SerialCommand:
         self.serial = serial
         self.cmd_queue = cmd_queue
         self.cmd = cmd
-    def send(self, data=(), minclock=0, reqclock=0):
-        cmd = self.cmd.encode(data)
+    def send(self, data=(), minclock=0, reqclock=0, encode_buf=None):
+        # An encode_buf list may be provided by callers that always send
+        # from the same thread - reusing it avoids allocating a new python
+        # list (cffi still converts it to a temporary uint8_t array)
+        if encode_buf is None:
+            cmd = self.cmd.encode(data)
+        else:
+            self.cmd.encode_into(encode_buf, data)
+            cmd = encode_buf
         self.serial.raw_send(cmd, minclock, reqclock, self.cmd_queue)
     def send_with_response(self, data=(), response=None, response_oid=None):
         cmd = self.cmd.encode(data)
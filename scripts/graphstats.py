@@ -4,8 +4,8 @@
 # Copyright (C) 2016-2018  Kevin O'Connor <kevin@koconnor.net>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import optparse, datetime
-import matplotlib
+import optparse, datetime, re
+import numpy, matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot, matplotlib.dates, matplotlib.font_manager
 import matplotlib.ticker
@@ -17,6 +17,8 @@ TASK_MAX=0.0025
 
 APPLY_PREFIX = ['mcu_awake', 'mcu_task_avg', 'mcu_task_stddev', 'bytes_write',
                 'bytes_read', 'bytes_retransmit', 'freq', 'adj']
+re_stats = re.compile(r'^(?:INFO:root:)?Stats[ \t]+(?P<sampletime>\S+):'
+                      r'(?P<stats>.*)$', re.M)
 
 def parse_log(logname, mcu):
     if mcu is None:
@@ -24,16 +26,13 @@ def parse_log(logname, mcu):
     mcu_prefix = mcu + ":"
     apply_prefix = { p: 1 for p in APPLY_PREFIX }
     f = open(logname, 'rb')
+    logdata = f.read()
+    f.close()
     out = []
-    for line in f:
-        parts = line.split()
-        if not parts or parts[0] not in ('Stats', 'INFO:root:Stats'):
-            #if parts and parts[0] == 'INFO:root:shutdown:':
-            #    break
-            continue
+    for m in re_stats.finditer(logdata):
         prefix = ""
         keyparts = {}
-        for p in parts[2:]:
+        for p in m.group('stats').split():
             if '=' not in p:
                 prefix = p
                 if prefix == mcu_prefix:
@@ -45,9 +44,8 @@ def parse_log(logname, mcu):
             keyparts[name] = val
         if 'print_time' not in keyparts:
             continue
-        keyparts['#sampletime'] = float(parts[1][:-1])
+        keyparts['#sampletime'] = float(m.group('sampletime'))
         out.append(keyparts)
-    f.close()
     return out
 
 def find_print_restarts(data):
@@ -78,41 +76,54 @@ def find_print_restarts(data):
                      for sampletime in samples if not stall}
     return sample_resets
 
-def plot_mcu(data, maxbw, outname):
-    # Generate data for plot
-    basetime = lasttime = data[0]['#sampletime']
-    lastbw = float(data[0]['bytes_write']) + float(data[0]['bytes_retransmit'])
-    sample_resets = find_print_restarts(data)
-    times = []
-    bwdeltas = []
-    loads = []
-    awake = []
-    hostbuffers = []
-    for d in data:
-        st = d['#sampletime']
-        timedelta = st - lasttime
-        if timedelta <= 0.:
+def get_column(data, key, default=None):
+    if default is None:
+        return numpy.array([float(d[key]) for d in data])
+    return numpy.array([float(d.get(key, default)) for d in data])
+
+def find_mcu_samples(sampletimes, bw):
+    # Skip samples where time does not advance or the byte counters reset
+    valid = []
+    basetimes = []
+    basebws = []
+    lasttime = sampletimes[0]
+    lastbw = bw[0]
+    for i in range(len(sampletimes)):
+        st = sampletimes[i]
+        if st <= lasttime:
             continue
-        bw = float(d['bytes_write']) + float(d['bytes_retransmit'])
-        if bw < lastbw:
-            lastbw = bw
+        if bw[i] < lastbw:
+            lastbw = bw[i]
             continue
-        load = float(d['mcu_task_avg']) + 3*float(d['mcu_task_stddev'])
-        if st - basetime < 15.:
-            load = 0.
-        pt = float(d['print_time'])
-        hb = float(d['buffer_time'])
-        if hb >= MAXBUFFER or st in sample_resets:
-            hb = 0.
-        else:
-            hb = 100. * (MAXBUFFER - hb) / MAXBUFFER
-        hostbuffers.append(hb)
-        times.append(datetime.datetime.utcfromtimestamp(st))
-        bwdeltas.append(100. * (bw - lastbw) / (maxbw * timedelta))
-        loads.append(100. * load / TASK_MAX)
-        awake.append(100. * float(d.get('mcu_awake', 0.)) / STATS_INTERVAL)
+        valid.append(i)
+        basetimes.append(lasttime)
+        basebws.append(lastbw)
         lasttime = st
-        lastbw = bw
+        lastbw = bw[i]
+    return (numpy.array(valid, dtype=int), numpy.array(basetimes),
+            numpy.array(basebws))
+
+def calc_mcu(data, maxbw):
+    sample_resets = find_print_restarts(data)
+    sampletimes = numpy.array([d['#sampletime'] for d in data])
+    bw = get_column(data, 'bytes_write') + get_column(data, 'bytes_retransmit')
+    valid, basetimes, basebws = find_mcu_samples(sampletimes, bw)
+    st = sampletimes[valid]
+    bwdeltas = 100. * (bw[valid] - basebws) / (maxbw * (st - basetimes))
+    load = (get_column(data, 'mcu_task_avg')[valid]
+            + 3. * get_column(data, 'mcu_task_stddev')[valid])
+    loads = numpy.where(st - sampletimes[0] < 15., 0., 100. * load / TASK_MAX)
+    hb = get_column(data, 'buffer_time')[valid]
+    is_reset = numpy.array([t in sample_resets for t in st], dtype=bool)
+    hostbuffers = numpy.where((hb >= MAXBUFFER) | is_reset, 0.,
+                              100. * (MAXBUFFER - hb) / MAXBUFFER)
+    awake = 100. * get_column(data, 'mcu_awake', 0.)[valid] / STATS_INTERVAL
+    return st, bwdeltas, loads, hostbuffers, awake
+
+def plot_mcu(data, maxbw, outname):
+    # Generate data for plot
+    st, bwdeltas, loads, hostbuffers, awake = calc_mcu(data, maxbw)
+    times = matplotlib.dates.epoch2num(st)
 
     # Build plot
     fig, ax1 = matplotlib.pyplot.subplots()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python2
+# Check graphstats.py mcu calculations against a reference implementation
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import random, unittest
+import graphstats
+
+def reference_calc_mcu(data, maxbw):
+    # Per-sample loop that graphstats.plot_mcu() originally used
+    basetime = lasttime = data[0]['#sampletime']
+    lastbw = float(data[0]['bytes_write']) + float(data[0]['bytes_retransmit'])
+    sample_resets = graphstats.find_print_restarts(data)
+    times = []
+    bwdeltas = []
+    loads = []
+    awake = []
+    hostbuffers = []
+    for d in data:
+        st = d['#sampletime']
+        timedelta = st - lasttime
+        if timedelta <= 0.:
+            continue
+        bw = float(d['bytes_write']) + float(d['bytes_retransmit'])
+        if bw < lastbw:
+            lastbw = bw
+            continue
+        load = float(d['mcu_task_avg']) + 3*float(d['mcu_task_stddev'])
+        if st - basetime < 15.:
+            load = 0.
+        hb = float(d['buffer_time'])
+        if hb >= graphstats.MAXBUFFER or st in sample_resets:
+            hb = 0.
+        else:
+            hb = 100. * (graphstats.MAXBUFFER - hb) / graphstats.MAXBUFFER
+        hostbuffers.append(hb)
+        times.append(st)
+        bwdeltas.append(100. * (bw - lastbw) / (maxbw * timedelta))
+        loads.append(100. * load / graphstats.TASK_MAX)
+        awake.append(100. * float(d.get('mcu_awake', 0.))
+                     / graphstats.STATS_INTERVAL)
+        lasttime = st
+        lastbw = bw
+    return times, bwdeltas, loads, hostbuffers, awake
+
+def make_data(sampletimes, bws, rnd):
+    return [{'#sampletime': st, 'bytes_write': str(bw),
+             'bytes_retransmit': str(rnd.randint(0, 3)),
+             'mcu_task_avg': str(rnd.random() * .001),
+             'mcu_task_stddev': str(rnd.random() * .0001),
+             'mcu_awake': str(rnd.random()), 'print_time': '1.0',
+             'buffer_time': str(rnd.random() * 3.),
+             'print_stall': str(rnd.randint(0, 2))}
+            for st, bw in zip(sampletimes, bws)]
+
+class TestCalcMCU(unittest.TestCase):
+    def check(self, data):
+        expected = reference_calc_mcu(data, graphstats.MAXBANDWIDTH)
+        actual = graphstats.calc_mcu(data, graphstats.MAXBANDWIDTH)
+        for exp, act in zip(expected, actual):
+            self.assertEqual(len(exp), len(act))
+            for e, a in zip(exp, act):
+                self.assertAlmostEqual(e, a)
+    def test_reset_then_earlier_time(self):
+        # Sample at t=16 is skipped for a byte counter reset, so t=8
+        # must still be accepted
+        rnd = random.Random(0)
+        data = make_data([2., 5., 16., 8., 9.], [2, 4, 2, 10, 7], rnd)
+        self.check(data)
+        st = graphstats.calc_mcu(data, graphstats.MAXBANDWIDTH)[0]
+        self.assertEqual(list(st), [5., 8.])
+    def test_random(self):
+        rnd = random.Random(1)
+        for i in range(2000):
+            count = rnd.randint(1, 12)
+            sampletimes = [float(rnd.randint(0, 40)) for j in range(count)]
+            bws = [rnd.randint(0, 20) for j in range(count)]
+            self.check(make_data(sampletimes, bws, rnd))
+    def test_appended_log(self):
+        # Host reboot that appends a new session to the same log
+        rnd = random.Random(2)
+        sampletimes = ([1000. + 5.*i for i in range(30)]
+                       + [900. + 5.*i for i in range(30)])
+        bws = [100*i for i in range(30)] + [50*i for i in range(30)]
+        self.check(make_data(sampletimes, bws, rnd))
+
+if __name__ == '__main__':
+    unittest.main()